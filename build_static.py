@@ -2,12 +2,43 @@
 """
 Script per crear una versió estàtica del projecte per GitHub Pages.
 Combina tots els mòduls JavaScript en un sol bundle.js
+
+Els imports es resolen com un graf de mòduls. La sortida transformada de cada
+mòdul es desa a una memòria cau (.bundle_cache.json) indexada per mtime i hash,
+de manera que després d'editar un fitxer només es torna a processar aquell mòdul.
 """
 
-import os
+import argparse
+import hashlib
+import json
 import re
+import time
+from datetime import datetime
 from pathlib import Path
 
+BASE_DIR = Path(__file__).parent
+CACHE_FILE = BASE_DIR / '.bundle_cache.json'
+
+# Cal incrementar-la quan canviï la transformació per invalidar la memòria cau
+CACHE_VERSION = 2
+
+# Només imports a l'inici de línia: els imports comentats no entren al graf
+IMPORT_PATTERN = re.compile(r"^[ \t]*import\s+{([^}]+)}\s+from\s+['\"]([^'\"]+)['\"];?", re.MULTILINE)
+# `export` només davant d'una declaració, mai dins d'identificadors o strings
+EXPORT_DECL_PATTERN = re.compile(r"^([ \t]*)export\s+(?=(?:async\s+)?function\b|const\b|let\b|var\b|class\b)", re.MULTILINE)
+# Llistes d'exports (`export { a, b };`): els noms ja són al mateix scope
+EXPORT_LIST_PATTERN = re.compile(r"^[ \t]*export\s*{[^}]*}\s*;?", re.MULTILINE)
+
+# Caràcters després dels quals una `/` comença una expressió regular i no una divisió
+REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+# Paraules clau després de les quals una `/` també comença una expressió regular
+REGEX_KEYWORDS = {'return', 'typeof', 'case', 'in', 'of', 'void', 'delete', 'throw',
+                  'new', 'else', 'yield', 'await', 'instanceof'}
+TRAILING_WORD_PATTERN = re.compile(r'(\.?)([A-Za-z0-9_$]+)$')
+
+# Memòria cau en memòria; es comparteix entre builds dins del mateix procés (mode watch)
+_cache = None
+
 def read_file(filepath):
     """Llegeix un fitxer i retorna el seu contingut"""
     with open(filepath, 'r', encoding='utf-8') as f:
@@ -18,80 +49,318 @@ def write_file(filepath, content):
     with open(filepath, 'w', encoding='utf-8') as f:
         f.write(content)
 
-def resolve_imports(content, base_dir, file_path, processed=None):
-    """Resol imports i els substitueix pel contingut dels mòduls"""
-    if processed is None:
-        processed = set()
-    
-    file_key = str(file_path)
-    if file_key in processed:
-        return ""
-    processed.add(file_key)
-    
-    # Trobar tots els imports
-    import_pattern = r"import\s+{([^}]+)}\s+from\s+['\"]([^'\"]+)['\"];?"
-    imports = re.findall(import_pattern, content)
-    
-    bundle_parts = []
-    
-    # Processar cada import
-    for imports_list, module_path in imports:
-        # Resoldre el path del mòdul
-        if module_path.startswith('./') or module_path.startswith('../'):
-            module_full_path = (file_path.parent / module_path).resolve()
+def load_cache():
+    """Carrega la memòria cau de mòduls (del procés o de disc)"""
+    global _cache
+    if _cache is None:
+        _cache = {}
+        if CACHE_FILE.exists():
+            try:
+                stored = json.loads(read_file(CACHE_FILE))
+                if stored.get('version') == CACHE_VERSION:
+                    _cache = stored.get('modules', {})
+            except (ValueError, OSError):
+                pass
+    return _cache
+
+def save_cache(cache):
+    """Desa la memòria cau de mòduls a disc"""
+    write_file(CACHE_FILE, json.dumps({'version': CACHE_VERSION, 'modules': cache}))
+
+def resolve_module_path(module_path, file_path, base_dir):
+    """Resol el path d'un import relatiu al fitxer que el conté"""
+    if module_path.startswith('./') or module_path.startswith('../'):
+        return (file_path.parent / module_path).resolve()
+    return (base_dir / module_path).resolve()
+
+def transform_module(content):
+    """Extreu els imports d'un mòdul i elimina imports i exports.
+
+    Es retornen els specifiers tal com apareixen al codi; es resolen a cada
+    recorregut del graf, de manera que crear o eliminar un mòdul importat es
+    detecta encara que el fitxer que l'importa no hagi canviat.
+    Els imports es substitueixen per línies buides perquè cada línia del codi
+    transformat correspongui a la mateixa línia del fitxer original.
+    """
+    imports = [match.group(2) for match in IMPORT_PATTERN.finditer(content)]
+    code = IMPORT_PATTERN.sub(lambda m: '\n' * m.group(0).count('\n'), content)
+    code = EXPORT_LIST_PATTERN.sub(lambda m: '\n' * m.group(0).count('\n'), code)
+    code = EXPORT_DECL_PATTERN.sub(r'\1', code)
+    return imports, code
+
+def load_module(rel_path, base_dir, cache, stats):
+    """Retorna l'entrada de la memòria cau d'un mòdul, reprocessant-lo només si ha canviat"""
+    file_path = base_dir / rel_path
+    st = file_path.stat()
+    entry = cache.get(rel_path)
+    if entry and entry['mtime'] == st.st_mtime_ns and entry['size'] == st.st_size:
+        stats['cached'] += 1
+        return entry
+
+    content = read_file(file_path)
+    digest = hashlib.sha1(content.encode('utf-8')).hexdigest()
+    if entry and entry['hash'] == digest:
+        # El fitxer s'ha tocat però el contingut és el mateix
+        entry.update(mtime=st.st_mtime_ns, size=st.st_size)
+        stats['cached'] += 1
+        return entry
+
+    imports, code = transform_module(content)
+    entry = {'mtime': st.st_mtime_ns, 'size': st.st_size, 'hash': digest, 'imports': imports, 'code': code}
+    cache[rel_path] = entry
+    stats['rebuilt'] += 1
+    return entry
+
+def resolve_deps(rel_path, imports, base_dir):
+    """Resol els imports d'un mòdul; els que no existeixen s'ometen amb un avís"""
+    file_path = base_dir / rel_path
+    deps = []
+    for module_path in imports:
+        dep_path = resolve_module_path(module_path, file_path, base_dir)
+        if dep_path.is_file() and dep_path.suffix == '.js':
+            deps.append(dep_path.relative_to(base_dir).as_posix())
         else:
-            module_full_path = (base_dir / module_path).resolve()
-        
-        if module_full_path.exists() and module_full_path.suffix == '.js':
-            # Llegir el mòdul importat
-            module_content = read_file(module_full_path)
-            # Resoldre imports recursivament
-            resolved_content = resolve_imports(module_content, base_dir, module_full_path, processed)
-            bundle_parts.append(f"\n// ===== {module_full_path.relative_to(base_dir)} =====\n{resolved_content}\n")
-    
-    # Eliminar exports (ja que tot estarà en el mateix scope)
-    content = re.sub(r'export\s+', '', content)
-    
-    # Eliminar imports (ja que els hem resolt)
-    content = re.sub(import_pattern, '', content)
-    
-    return '\n'.join(bundle_parts) + '\n' + content
-
-def build_bundle():
+            print(f"Warning: no s'ha trobat el mòdul {module_path} (importat des de {rel_path})")
+    return deps
+
+def module_graph(entry_path, base_dir, cache, stats):
+    """Recorre el graf d'imports i retorna els mòduls en ordre topològic (dependències primer)"""
+    order = []
+    visited = set()
+
+    def visit(rel_path):
+        if rel_path in visited:
+            return
+        visited.add(rel_path)
+        entry = load_module(rel_path, base_dir, cache, stats)
+        for dep in resolve_deps(rel_path, entry['imports'], base_dir):
+            visit(dep)
+        order.append(rel_path)
+
+    visit(entry_path)
+    return order
+
+def vlq_encode(value):
+    """Codifica un enter en base64 VLQ (format de source maps v3)"""
+    chars = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/'
+    value = (-value << 1) | 1 if value < 0 else value << 1
+    encoded = ''
+    while True:
+        digit = value & 31
+        value >>= 5
+        if value:
+            digit |= 32
+        encoded += chars[digit]
+        if not value:
+            return encoded
+
+def build_source_map(line_origins, sources, output_name):
+    """Genera un source map v3 línia a línia a partir de (índex de font, línia) per cada línia"""
+    segments = []
+    prev_source, prev_line = 0, 0
+    for origin in line_origins:
+        if origin is None:
+            segments.append('')
+            continue
+        source, line = origin
+        segments.append('A' + vlq_encode(source - prev_source) + vlq_encode(line - prev_line) + 'A')
+        prev_source, prev_line = source, line
+    return {
+        'version': 3,
+        'file': output_name,
+        'sources': sources,
+        'names': [],
+        'mappings': ';'.join(segments)
+    }
+
+def _output_tail(out, size=32):
+    """Últims caràcters ja emesos pel minificador"""
+    chunks, length = [], 0
+    for chunk in reversed(out):
+        chunks.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            break
+    return ''.join(reversed(chunks))
+
+def regex_allowed(tail):
+    """Decideix si una `/` després de `tail` comença una expressió regular.
+
+    Es mira el token anterior: un operador, una puntuació oberta o una paraula
+    clau com `return` permeten una regex; un identificador, un literal, `)`,
+    `]` o els operadors postfix `++`/`--` indiquen una divisió.
+    """
+    tail = tail.rstrip()
+    if not tail:
+        return True
+    word = TRAILING_WORD_PATTERN.search(tail)
+    if word:
+        # `obj.return / 2` és una propietat, no una paraula clau
+        return not word.group(1) and word.group(2) in REGEX_KEYWORDS
+    if tail.endswith(('++', '--')):
+        return False
+    return tail[-1] in REGEX_PRECEDERS
+
+def minify_js(code):
+    """Minificació conservadora: elimina comentaris, sagnat, espais repetits i línies buides.
+
+    Els salts de línia es mantenen (inserció automàtica de punt i coma) i el
+    contingut de strings, template literals (amb ${} niats) i expressions
+    regulars es copia tal qual.
+    """
+    out = []
+    templates = []  # profunditat de claus on s'ha obert cada ${ d'un template
+    depth = 0
+    i, n = 0, len(code)
+
+    def scan_template(k):
+        # Des de dins d'un template fins al ` de tancament o al següent ${
+        while k < n:
+            if code[k] == '\\':
+                k += 2
+            elif code[k] == '`':
+                return k + 1, False
+            elif code.startswith('${', k):
+                return k + 2, True
+            else:
+                k += 1
+        return n, False
+
+    while i < n:
+        c = code[i]
+        if c == '\n':
+            while out and out[-1] in ' \t':
+                out.pop()
+            if out and out[-1] != '\n':
+                out.append('\n')
+            i += 1
+            while i < n and code[i] in ' \t':
+                i += 1
+        elif c in ' \t':
+            if out and out[-1] not in ' \t\n':
+                out.append(' ')
+            i += 1
+        elif code.startswith('//', i):
+            j = code.find('\n', i)
+            i = n if j == -1 else j
+        elif code.startswith('/*', i):
+            j = code.find('*/', i + 2)
+            i = n if j == -1 else j + 2
+        elif c in '"\'':
+            j = i + 1
+            while j < n and code[j] != c and code[j] != '\n':
+                j += 2 if code[j] == '\\' else 1
+            out.append(code[i:j + 1])
+            i = j + 1
+        elif c == '`' or (c == '}' and templates and templates[-1] == depth):
+            if c == '}':
+                templates.pop()
+            j, opened = scan_template(i + 1)
+            if opened:
+                templates.append(depth)
+            out.append(code[i:j])
+            i = j
+        elif c == '/' and regex_allowed(_output_tail(out)):
+            j, in_class = i + 1, False
+            while j < n and code[j] != '\n':
+                if code[j] == '\\':
+                    j += 1
+                elif code[j] == '[':
+                    in_class = True
+                elif code[j] == ']':
+                    in_class = False
+                elif code[j] == '/' and not in_class:
+                    break
+                j += 1
+            if j < n and code[j] == '/':
+                j += 1
+                while j < n and code[j].isalpha():
+                    j += 1
+                out.append(code[i:j])
+                i = j
+            else:
+                out.append(c)
+                i += 1
+        else:
+            if c == '{':
+                depth += 1
+            elif c == '}':
+                depth -= 1
+            out.append(c)
+            i += 1
+
+    return ''.join(out).strip() + '\n'
+
+def build_bundle(sourcemap=False, minify=False, use_cache=True):
     """Crea el bundle principal"""
-    base_dir = Path(__file__).parent
+    base_dir = BASE_DIR
     main_file = base_dir / 'main.js'
-    
+
     print("Building bundle for GitHub Pages...")
-    
+
     if not main_file.exists():
         print(f"Error: {main_file} not found!")
         return False
-    
-    # Llegir main.js
-    main_content = read_file(main_file)
-    
-    # Resoldre imports
-    bundle_content = resolve_imports(main_content, base_dir, main_file, set())
-    
+
+    start = time.perf_counter()
+    cache = load_cache() if use_cache else {}
+    stats = {'cached': 0, 'rebuilt': 0}
+    entry = main_file.relative_to(base_dir).as_posix()
+    order = module_graph(entry, base_dir, cache, stats)
+
     # Afegir header
     header = f"""// Bundle generat automàticament per GitHub Pages
-// Generat el: {__import__('datetime').datetime.now().isoformat()}
+// Generat el: {datetime.now().isoformat()}
 // d3 està disponible globalment des de index.html
-
 """
-    
-    full_bundle = header + bundle_content
-    
-    # Escriure bundle
+
+    # Concatenar mòduls, recordant l'origen de cada línia per al source map
+    lines = header.split('\n')
+    line_origins = [None] * len(lines)
+    for index, rel_path in enumerate(order):
+        if rel_path != entry:
+            lines += ['', f"// ===== {rel_path} ====="]
+            line_origins += [None, None]
+        module_lines = cache[rel_path]['code'].split('\n')
+        lines += module_lines
+        line_origins += [(index, line) for line in range(len(module_lines))]
+
     bundle_path = base_dir / 'bundle.js'
+    full_bundle = '\n'.join(lines)
+
+    if sourcemap:
+        map_path = bundle_path.with_name(bundle_path.name + '.map')
+        write_file(map_path, json.dumps(build_source_map(line_origins, order, bundle_path.name)))
+        full_bundle += f"\n//# sourceMappingURL={map_path.name}\n"
+        print(f"✓ Source map: {map_path}")
+
+    # Escriure bundle
     write_file(bundle_path, full_bundle)
-    
+
+    if minify:
+        min_path = bundle_path.with_name('bundle.min.js')
+        write_file(min_path, f"// Bundle generat el: {datetime.now().isoformat()}\n" + minify_js('\n'.join(lines)))
+        print(f"✓ Bundle minificat: {min_path} ({min_path.stat().st_size / 1024:.2f} KB)")
+
+    if use_cache:
+        # Eliminar de la memòria cau els mòduls que ja no formen part del graf
+        for stale in set(cache) - set(order):
+            del cache[stale]
+        if stats['rebuilt']:
+            save_cache(cache)
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
     size_kb = bundle_path.stat().st_size / 1024
     print(f"✓ Bundle creat: {bundle_path}")
     print(f"✓ Mida: {size_kb:.2f} KB")
-    
+    print(f"✓ Mòduls: {len(order)} ({stats['rebuilt']} reprocessats, {stats['cached']} de la memòria cau) en {elapsed_ms:.1f} ms")
+
     return True
 
 if __name__ == '__main__':
-    build_bundle()
+    parser = argparse.ArgumentParser(description="Genera bundle.js per GitHub Pages")
+    parser.add_argument('--sourcemap', action='store_true', help="Genera també bundle.js.map")
+    parser.add_argument('--minify', action='store_true', help="Genera també bundle.min.js")
+    parser.add_argument('--no-cache', action='store_true', help="Ignora la memòria cau de mòduls")
+    args = parser.parse_args()
+    build_bundle(sourcemap=args.sourcemap, minify=args.minify, use_cache=not args.no_cache)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Històric de mètriques per regió entre execucions del pipeline.
+Cada execució de process_data.py afegeix les mètriques de cada regió a una
+base de dades SQLite local, indexada per (ocean, region), de manera que es
+poden consultar tendències sense tornar a llegir metrics.json antics.
+
+Cada execució pertany a una sèrie (per defecte, el nom del CSV sense
+extensió). Les comparacions entre execucions només tenen sentit dins d'una
+mateixa sèrie: els snapshots d'un batch són sèries diferents.
+"""
+
+import argparse
+import sqlite3
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).parent.parent
+HISTORY_DB = BASE_DIR / "data" / "history" / "metrics_history.db"
+
+# Mètriques per regió que es desen (mateix nom que a metrics['IGRM'])
+REGION_METRICS = ['nSamples', 'meanConcentration', 'ICR', 'completenessIndex', 'normalizedDiversity', 'IGRM']
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_at TEXT NOT NULL,
+    source TEXT,
+    series TEXT,
+    total_samples INTEGER
+);
+CREATE TABLE IF NOT EXISTS region_metrics (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    ocean TEXT,
+    region TEXT,
+    {', '.join(f"{metric} {'INTEGER' if metric == 'nSamples' else 'REAL'}" for metric in REGION_METRICS)}
+);
+CREATE INDEX IF NOT EXISTS idx_region_metrics_region ON region_metrics (ocean, region, run_id);
+CREATE INDEX IF NOT EXISTS idx_region_metrics_run ON region_metrics (run_id);
+CREATE INDEX IF NOT EXISTS idx_runs_run_at ON runs (run_at);
+CREATE INDEX IF NOT EXISTS idx_runs_series ON runs (series, run_at);
+"""
+
+def default_series(source):
+    """Sèrie d'una execució quan no se n'indica cap: el nom del CSV sense extensió"""
+    return Path(source).stem if source else None
+
+@contextmanager
+def connect(db_path=HISTORY_DB):
+    """Obre (i crea si cal) la base de dades de l'històric; confirma i tanca en sortir"""
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    # Timeout generós: els workers del mode batch poden escriure alhora
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        conn.executescript(SCHEMA)
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+def _clean(value):
+    """Converteix valors de numpy/pandas a tipus de SQLite (NaN → NULL)"""
+    if value is None:
+        return None
+    if isinstance(value, (float, np.floating)):
+        return None if np.isnan(value) or np.isinf(value) else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return value
+
+def record_run(metrics, source=None, db_path=HISTORY_DB, run_at=None, series=None):
+    """Afegeix les mètriques per regió d'una execució. Retorna el run_id"""
+    run_at = run_at or datetime.now().isoformat(timespec='seconds')
+    series = series or default_series(source)
+    total_samples = (metrics.get('summary') or {}).get('totalSamples')
+    rows = metrics.get('IGRM') or []
+
+    with connect(db_path) as conn:
+        cursor = conn.execute(
+            "INSERT INTO runs (run_at, source, series, total_samples) VALUES (?, ?, ?, ?)",
+            (run_at, source, series, _clean(total_samples))
+        )
+        run_id = cursor.lastrowid
+        conn.executemany(
+            f"INSERT INTO region_metrics (run_id, ocean, region, {', '.join(REGION_METRICS)}) "
+            f"VALUES (?, ?, ?, {', '.join('?' for _ in REGION_METRICS)})",
+            [
+                (run_id, _clean(row.get('ocean')), _clean(row.get('region')),
+                 *(_clean(row.get(metric)) for metric in REGION_METRICS))
+                for row in rows
+            ]
+        )
+    return run_id
+
+def list_runs(db_path=HISTORY_DB, series=None):
+    """Llista les execucions desades (totes o només les d'una sèrie)"""
+    with connect(db_path) as conn:
+        return pd.read_sql_query(
+            "SELECT run_id, run_at, series, source, total_samples FROM runs "
+            "WHERE ? IS NULL OR series IS ? ORDER BY series, run_at, run_id",
+            conn, params=(series, series)
+        )
+
+def region_history(ocean, region, db_path=HISTORY_DB, metrics=None, series=None):
+    """Històric de mètriques d'una regió, ordenat per data d'execució.
+    Amb `series` només es retornen les execucions d'aquella sèrie.
+    """
+    columns = _check_metrics(metrics or REGION_METRICS)
+    with connect(db_path) as conn:
+        return pd.read_sql_query(
+            f"SELECT r.run_id, r.run_at, r.series, r.source, {', '.join('m.' + c for c in columns)} "
+            "FROM region_metrics m JOIN runs r ON r.run_id = m.run_id "
+            "WHERE m.ocean IS ? AND m.region IS ? AND (? IS NULL OR r.series IS ?) "
+            "ORDER BY r.series, r.run_at, r.run_id",
+            conn, params=(ocean, region, series, series)
+        )
+
+def top_movers(run_a, run_b, metric='IGRM', n=10, db_path=HISTORY_DB):
+    """Regions amb el canvi absolut més gran d'una mètrica entre dues execucions.
+    Les dues execucions han de ser de la mateixa sèrie.
+    """
+    metric = _check_metrics([metric])[0]
+    with connect(db_path) as conn:
+        series = dict(conn.execute("SELECT run_id, series FROM runs WHERE run_id IN (?, ?)", (run_a, run_b)).fetchall())
+        missing = [str(run_id) for run_id in (run_a, run_b) if run_id not in series]
+        if missing:
+            raise ValueError(f"Execucions inexistents: {', '.join(missing)}")
+        if series[run_a] != series[run_b]:
+            raise ValueError(f"Les execucions {run_a} ({series[run_a]}) i {run_b} ({series[run_b]}) "
+                             "són de sèries diferents i no es poden comparar")
+        return pd.read_sql_query(
+            f"SELECT b.ocean, b.region, a.{metric} AS value_a, b.{metric} AS value_b, "
+            f"b.{metric} - a.{metric} AS delta "
+            "FROM region_metrics a JOIN region_metrics b "
+            "ON a.ocean IS b.ocean AND a.region IS b.region "
+            f"WHERE a.run_id = ? AND b.run_id = ? AND a.{metric} IS NOT NULL AND b.{metric} IS NOT NULL "
+            "ORDER BY ABS(delta) DESC LIMIT ?",
+            conn, params=(run_a, run_b, n)
+        )
+
+def _check_metrics(metrics):
+    """Evita noms de columna arbitraris a les consultes"""
+    unknown = [metric for metric in metrics if metric not in REGION_METRICS]
+    if unknown:
+        raise ValueError(f"Mètriques desconegudes: {', '.join(unknown)} (disponibles: {', '.join(REGION_METRICS)})")
+    return list(metrics)
+
+def main():
+    parser = argparse.ArgumentParser(description="Consulta l'històric de mètriques per regió")
+    parser.add_argument('--db', type=Path, default=HISTORY_DB, help="Base de dades de l'històric")
+    commands = parser.add_subparsers(dest='command', required=True)
+    runs_parser = commands.add_parser('runs', help="Llista les execucions desades")
+    runs_parser.add_argument('--series', help="Només les execucions d'aquesta sèrie")
+    region_parser = commands.add_parser('region', help="Històric d'una regió")
+    region_parser.add_argument('ocean')
+    region_parser.add_argument('region')
+    region_parser.add_argument('--series', help="Només les execucions d'aquesta sèrie")
+    movers_parser = commands.add_parser('movers', help="Regions amb més canvi entre dues execucions")
+    movers_parser.add_argument('run_a', type=int)
+    movers_parser.add_argument('run_b', type=int)
+    movers_parser.add_argument('--metric', default='IGRM', choices=REGION_METRICS)
+    movers_parser.add_argument('-n', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == 'runs':
+        result = list_runs(args.db, args.series)
+    elif args.command == 'region':
+        result = region_history(args.ocean, args.region, args.db, series=args.series)
+    else:
+        try:
+            result = top_movers(args.run_a, args.run_b, args.metric, args.n, args.db)
+        except ValueError as e:
+            print(f"✗ Error: {e}")
+            sys.exit(1)
+    print(result.to_string(index=False) if len(result) else "(sense resultats)")
+
+if __name__ == '__main__':
+    main()
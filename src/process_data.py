@@ -7,96 +7,268 @@ Genera fitxers JSON per a la visualització web
 import pandas as pd
 import json
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
+import argparse
+import glob
+import re
 import sys
 
+from metrics_history import HISTORY_DB, record_run
+
 # Configuració de paths
 BASE_DIR = Path(__file__).parent.parent
 DATA_RAW = BASE_DIR / "data" / "raw"
 DATA_PROCESSED = BASE_DIR / "data" / "processed"
 CSV_FILE = DATA_RAW / "microplastics.csv"
+# Conjunts grans que també s'exporten dividits en un fitxer per clau, perquè el
+# frontend només descarregui les parts que necessita (vegeu manifest.json)
+SHARDED_DATASETS = {
+    'violin_data.json': 'year',
+    'method_data.json': 'method'
+}
+SHARDS_DIR = "shards"
 
-# Crear directori processed si no existeix
-DATA_PROCESSED.mkdir(parents=True, exist_ok=True)
-
-print("=" * 60)
-print("PROCESSAMENT DE DADES DE MICROPLÀSTICS")
-print("=" * 60)
-
-# Carregar dades
-print(f"\n1. Carregant dades de {CSV_FILE}...")
-try:
-    microplastics = pd.read_csv(CSV_FILE, low_memory=False)
-    print(f"   ✓ Dades carregades: {len(microplastics)} registres, {len(microplastics.columns)} variables")
-except FileNotFoundError:
-    print(f"   ✗ Error: No s'ha trobat el fitxer {CSV_FILE}")
-    sys.exit(1)
-except Exception as e:
-    print(f"   ✗ Error carregant dades: {e}")
-    sys.exit(1)
-
-# Preparació de dades
-print("\n2. Preparant dades...")
-microplastics = microplastics.copy()
-
-# Netejar i parsejar dates
-def parse_date(date_str):
-    """Parseja dates en format MM/DD/YYYY (amb o sense temps)"""
-    if pd.isna(date_str) or date_str == '':
-        return None
+# Llavor fixa dels mostrejos (scatter, parallel): mateixes dades → mateixos fitxers
+SAMPLE_SEED = 42
+
+# Directori de sortida per defecte del mode batch (un subdirectori per snapshot)
+BATCH_OUT_ROOT = DATA_PROCESSED / "snapshots"
+
+# ============================================================================
+# ESQUEMA DEL CSV ORIGINAL
+# ============================================================================
+# Formats de data acceptats, en ordre de preferència
+DATE_FORMATS = ['%m/%d/%Y %I:%M:%S %p', '%m/%d/%Y']
+
+# Unitats conegudes a la columna 'Unit' del dataset de NOAA
+KNOWN_UNITS = {'pieces/m3', 'pieces kg-1 d.w.'}
+
+# Esquema declarat: cada regla té una columna, un tipus de comprovació i una
+# severitat. Les regles 'error' descarten la fila; les 'warning' només s'informen.
+RAW_SCHEMA = {
+    'lat_missing': {
+        'column': 'Latitude (degree)', 'check': 'missing', 'severity': 'error',
+        'description': 'Latitud absent o no numèrica'
+    },
+    'lat_out_of_range': {
+        'column': 'Latitude (degree)', 'check': 'range', 'min': -90, 'max': 90, 'severity': 'error',
+        'description': 'Latitud fora del rang [-90, 90]'
+    },
+    'lon_missing': {
+        'column': 'Longitude(degree)', 'check': 'missing', 'severity': 'error',
+        'description': 'Longitud absent o no numèrica'
+    },
+    'lon_out_of_range': {
+        'column': 'Longitude(degree)', 'check': 'range', 'min': -180, 'max': 180, 'severity': 'error',
+        'description': 'Longitud fora del rang [-180, 180]'
+    },
+    'concentration_missing': {
+        'column': 'Microplastics measurement', 'check': 'missing', 'severity': 'error',
+        'description': 'Concentració absent o no numèrica'
+    },
+    'concentration_non_positive': {
+        'column': 'Microplastics measurement', 'check': 'range', 'min_exclusive': 0, 'severity': 'error',
+        'description': 'Concentració menor o igual a 0'
+    },
+    'date_unparseable': {
+        'column': 'Date (MM-DD-YYYY)', 'check': 'date', 'severity': 'warning',
+        'description': 'Data informada però no parsejable'
+    },
+    'unit_unknown': {
+        'column': 'Unit', 'check': 'allowed', 'allowed': KNOWN_UNITS, 'severity': 'warning',
+        'description': 'Unitat desconeguda'
+    },
+    'mesh_size_outlier': {
+        'column': 'Mesh size (mm)', 'check': 'range', 'min_exclusive': 0, 'max': 10, 'severity': 'warning',
+        'description': 'Mida de malla fora del rang (0, 10] mm'
+    }
+}
+
+# Nombre màxim d'índexs de fila d'exemple per regla a l'informe de qualitat
+QUALITY_SAMPLE_SIZE = 10
+
+def load_data(csv_file=CSV_FILE):
+    """Carrega el CSV original; propaga els errors perquè qui crida decideixi"""
+    print(f"\n1. Carregant dades de {csv_file}...")
+    raw = pd.read_csv(csv_file, low_memory=False)
+    print(f"   ✓ Dades carregades: {len(raw)} registres, {len(raw.columns)} variables")
+    return raw
+
+# Taula de dates ja parsejades (text original → data). Es comparteix entre tots
+# els snapshots processats dins del mateix procés (mode batch)
+_date_lookup = {}
+
+def within_ns_bounds(parsed):
+    """Passa un resultat de pd.to_datetime a datetime64[ns].
+    Les dates fora del rang representable (p. ex. l'any 0201) queden com NaT"""
+    parsed = pd.to_datetime(parsed, errors='coerce')
+    in_bounds = (parsed >= pd.Timestamp.min) & (parsed <= pd.Timestamp.max)
+    return parsed.where(in_bounds).astype('datetime64[ns]')
+
+def parse_date_value(value):
+    """Parseja una sola data amb la inferència de pandas. Les dates amb zona
+    horària es conserven com a hora local; les no parsejables o fora de rang
+    retornen NaT"""
     try:
-        # Intentar primer amb el format complet (amb temps): "7/13/1989 12:00:00 AM"
-        date_obj = pd.to_datetime(date_str, format='%m/%d/%Y %I:%M:%S %p', errors='coerce')
-        if pd.isna(date_obj):
-            # Si falla, intentar sense temps
-            date_obj = pd.to_datetime(date_str, format='%m/%d/%Y', errors='coerce')
-        if pd.isna(date_obj):
-            # Si encara falla, deixar que pandas ho intenti automàticament
-            date_obj = pd.to_datetime(date_str, errors='coerce')
-        return date_obj if not pd.isna(date_obj) else None
-    except:
-        return None
+        date_obj = pd.to_datetime(value, errors='coerce')
+    except (ValueError, TypeError, OverflowError):
+        return pd.NaT
+    if pd.isna(date_obj):
+        return pd.NaT
+    if date_obj.tzinfo is not None:
+        date_obj = date_obj.tz_localize(None)
+    return date_obj if pd.Timestamp.min <= date_obj <= pd.Timestamp.max else pd.NaT
+
+def parse_date_values(values):
+    """Parseja valors de data MM/DD/YYYY (amb o sense temps) de forma vectoritzada"""
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    pending = pd.Series(True, index=values.index)
+    for fmt in DATE_FORMATS:
+        if not pending.any():
+            break
+        parsed[pending] = within_ns_bounds(pd.to_datetime(values[pending], format=fmt, errors='coerce'))
+        pending &= parsed.isna()
+    # Els pocs valors restants es deixen a la inferència de pandas, element a element
+    if pending.any():
+        parsed[pending] = within_ns_bounds(values[pending].map(parse_date_value).astype(object))
+    return parsed
+
+def normalize_text(series):
+    """Text sense espais als extrems; les cel·les buides passen a NA"""
+    text = series.astype('string').str.strip()
+    return text.where(text != '')
+
+def parse_dates(raw):
+    """Parseja una columna de dates ja normalitzada amb normalize_text.
+    Només es parsegen els valors únics no vistos abans"""
+    new_values = [value for value in raw.dropna().unique() if value not in _date_lookup]
+    if new_values:
+        new_values = pd.Series(new_values, dtype='string')
+        _date_lookup.update(zip(new_values, parse_date_values(new_values)))
+    return pd.to_datetime(raw.map(_date_lookup), errors='coerce')
+
+def validate_raw(df, coerced, present, schema=RAW_SCHEMA):
+    """Aplica les regles de l'esquema amb màscares vectoritzades.
+
+    `coerced` conté les columnes ja convertides (numèriques i dates) que també
+    fa servir la neteja, i `present` les màscares de cel·les informades de les
+    columnes de text ja normalitzades, de manera que la validació no torna a
+    recórrer les dades.
+    Retorna un diccionari {regla: màscara booleana de files que la incompleixen}.
+    """
+    violations = {}
+    for rule, spec in schema.items():
+        column = spec['column']
+        if column not in df.columns:
+            continue
+        values = coerced.get(column, df[column])
+        check = spec['check']
+        if check == 'missing':
+            mask = values.isna()
+        elif check == 'range':
+            mask = pd.Series(False, index=df.index)
+            if 'min' in spec:
+                mask |= values < spec['min']
+            if 'min_exclusive' in spec:
+                mask |= values <= spec['min_exclusive']
+            if 'max' in spec:
+                mask |= values > spec['max']
+        elif check == 'date':
+            mask = present[column] & values.isna()
+        elif check == 'allowed':
+            mask = values.notna() & ~values.astype('string').str.strip().isin(spec['allowed'])
+        else:
+            raise ValueError(f"Tipus de comprovació desconegut a l'esquema: {check}")
+        violations[rule] = mask.fillna(False).astype(bool)
+    return violations
+
+def build_quality_report(df, violations, valid_mask, source, schema=RAW_SCHEMA):
+    """Construeix l'informe de qualitat amb recomptes i índexs d'exemple per regla"""
+    rules = {}
+    for rule, mask in violations.items():
+        spec = schema[rule]
+        rules[rule] = {
+            'column': spec['column'],
+            'severity': spec['severity'],
+            'description': spec['description'],
+            'count': int(mask.sum()),
+            'sampleRowIndices': [int(i) for i in df.index[mask][:QUALITY_SAMPLE_SIZE]]
+        }
+    missing_columns = sorted({spec['column'] for spec in schema.values()} - set(df.columns))
+    return {
+        'source': source,
+        # sampleRowIndices són índexs 0-based de les files de dades (sense la capçalera)
+        'sampleRowIndexBase': 0,
+        'totalRows': len(df),
+        'validRows': int(valid_mask.sum()),
+        'droppedRows': int((~valid_mask).sum()),
+        'missingColumns': missing_columns,
+        'rules': rules
+    }
+
+def prepare_data(raw, source=CSV_FILE.name):
+    """Valida i neteja les dades originals. Retorna (dades netes, informe de qualitat)"""
+    # Preparació de dades
+    print("\n2. Preparant i validant dades...")
+    microplastics = raw.copy()
+
+    # Convertir un sol cop les columnes que comparteixen validació i neteja
+    date_text = normalize_text(microplastics['Date (MM-DD-YYYY)'])
+    present = {'Date (MM-DD-YYYY)': date_text.notna()}
+    coerced = {
+        'Latitude (degree)': pd.to_numeric(microplastics['Latitude (degree)'], errors='coerce'),
+        'Longitude(degree)': pd.to_numeric(microplastics['Longitude(degree)'], errors='coerce'),
+        'Microplastics measurement': pd.to_numeric(microplastics['Microplastics measurement'], errors='coerce'),
+        'Date (MM-DD-YYYY)': parse_dates(date_text)
+    }
+    if 'Mesh size (mm)' in microplastics.columns:
+        coerced['Mesh size (mm)'] = pd.to_numeric(microplastics['Mesh size (mm)'], errors='coerce')
+
+    violations = validate_raw(microplastics, coerced, present)
+    valid_mask = pd.Series(True, index=microplastics.index)
+    for rule, mask in violations.items():
+        if RAW_SCHEMA[rule]['severity'] == 'error':
+            valid_mask &= ~mask
+
+    quality_report = build_quality_report(microplastics, violations, valid_mask, source)
+
+    for rule, info in quality_report['rules'].items():
+        if info['count'] > 0:
+            marker = '✗' if info['severity'] == 'error' else '!'
+            print(f"   {marker} {rule}: {info['count']} files ({info['description']})")
+
+    microplastics['Date_parsed'] = coerced['Date (MM-DD-YYYY)']
+    microplastics['Year'] = microplastics['Date_parsed'].dt.year.astype('Int64')
+
+    print(f"   ✓ Dates parsejades: {microplastics['Date_parsed'].notna().sum()} / {len(microplastics)}")
+    print(f"   ✓ Anys vàlids: {microplastics['Year'].notna().sum()} / {len(microplastics)}")
+
+    microplastics['Microplastics measurement'] = coerced['Microplastics measurement']
+
+    # Filtrar dades vàlides (files sense cap error de l'esquema)
+    initial_count = len(microplastics)
+    microplastics = microplastics[valid_mask].copy()
+
+    print(f"   ✓ Dades vàlides: {len(microplastics)} registres (filtrades {initial_count - len(microplastics)} invàlides)")
 
-microplastics['Date_parsed'] = microplastics['Date (MM-DD-YYYY)'].apply(parse_date)
-# Extraure l'any només si Date_parsed no és null
-microplastics['Year'] = microplastics['Date_parsed'].apply(lambda x: x.year if pd.notna(x) else None)
-
-print(f"   ✓ Dates parsejades: {microplastics['Date_parsed'].notna().sum()} / {len(microplastics)}")
-print(f"   ✓ Anys vàlids: {microplastics['Year'].notna().sum()} / {len(microplastics)}")
-
-# Netejar concentracions
-microplastics['Microplastics measurement'] = pd.to_numeric(
-    microplastics['Microplastics measurement'], 
-    errors='coerce'
-)
-
-# Filtrar dades vàlides
-initial_count = len(microplastics)
-microplastics = microplastics[
-    (microplastics['Microplastics measurement'].notna()) &
-    (microplastics['Microplastics measurement'] > 0) &
-    (microplastics['Latitude (degree)'].notna()) &
-    (microplastics['Longitude(degree)'].notna())
-].copy()
-
-print(f"   ✓ Dades vàlides: {len(microplastics)} registres (filtrades {initial_count - len(microplastics)} invàlides)")
-
-# Crear columnes auxiliars
-microplastics['concentration'] = microplastics['Microplastics measurement']
-microplastics['lat'] = pd.to_numeric(microplastics['Latitude (degree)'], errors='coerce')
-microplastics['lon'] = pd.to_numeric(microplastics['Longitude(degree)'], errors='coerce')
-microplastics['depth'] = pd.to_numeric(microplastics['Water Sample Depth (m)'], errors='coerce')
-microplastics['ocean'] = microplastics['Ocean']
-microplastics['region'] = microplastics['Region']
-microplastics['country'] = microplastics['Country']
-microplastics['method'] = microplastics['Sampling Method']
-microplastics['marineSetting'] = microplastics['Marine Setting']
+    # Crear columnes auxiliars
+    microplastics['concentration'] = microplastics['Microplastics measurement']
+    microplastics['lat'] = coerced['Latitude (degree)'][valid_mask]
+    microplastics['lon'] = coerced['Longitude(degree)'][valid_mask]
+    microplastics['depth'] = pd.to_numeric(microplastics['Water Sample Depth (m)'], errors='coerce')
+    microplastics['ocean'] = microplastics['Ocean']
+    microplastics['region'] = microplastics['Region']
+    microplastics['country'] = microplastics['Country']
+    microplastics['method'] = microplastics['Sampling Method']
+    microplastics['marineSetting'] = microplastics['Marine Setting']
+
+    return microplastics, quality_report
 
 # ============================================================================
 # MÈTRIQUES: Índex de Contaminació Regional (ICR)
 # ============================================================================
-print("\n3. Calculant Índex de Contaminació Regional (ICR)...")
 
 def calculate_ICR(df):
     """Calcula l'ICR per regió"""
@@ -129,13 +301,9 @@ def calculate_ICR(df):
     
     return grouped.sort_values('ICR', ascending=False)
 
-icr_data = calculate_ICR(microplastics)
-print(f"   ✓ ICR calculat per {len(icr_data)} regions")
-
 # ============================================================================
 # MÈTRIQUES: Taxa de Canvi Temporal (TCT)
 # ============================================================================
-print("\n4. Calculant Taxa de Canvi Temporal (TCT)...")
 
 def calculate_TCT(df):
     """Calcula TCT per any"""
@@ -152,9 +320,6 @@ def calculate_TCT(df):
     
     return yearly
 
-by_year = calculate_TCT(microplastics)
-print(f"   ✓ TCT calculat per {len(by_year)} anys")
-
 # TCT per any i regió
 def calculate_TCT_by_region(df):
     """Calcula TCT per any i regió"""
@@ -177,13 +342,9 @@ def calculate_TCT_by_region(df):
         return pd.concat(result, ignore_index=True)
     return pd.DataFrame()
 
-by_year_region = calculate_TCT_by_region(microplastics)
-print(f"   ✓ TCT per regió calculat per {len(by_year_region)} combinacions any-regió")
-
 # ============================================================================
 # MÈTRIQUES: Correlació Profunditat-Concentració
 # ============================================================================
-print("\n5. Calculant correlació profunditat-concentració...")
 
 def calculate_depth_correlation(df):
     """Calcula correlació entre profunditat i concentració"""
@@ -216,13 +377,9 @@ def calculate_depth_correlation(df):
         'strength': strength
     }
 
-depth_corr = calculate_depth_correlation(microplastics)
-print(f"   ✓ Correlació: {depth_corr['correlation']} ({depth_corr['strength']})")
-
 # ============================================================================
 # MÈTRIQUES: Índex de Completitud de Dades per Regió
 # ============================================================================
-print("\n6. Calculant Índex de Completitud de Dades per Regió...")
 
 def calculate_data_completeness(df):
     """Calcula l'índex de completitud de dades per regió"""
@@ -286,16 +443,9 @@ def calculate_data_completeness(df):
     
     return pd.DataFrame(completeness_data).sort_values('completenessIndex', ascending=False)
 
-completeness_data = calculate_data_completeness(microplastics)
-print(f"   ✓ Completitud calculada per {len(completeness_data)} regions")
-print(f"   ✓ Completitud mitjana: {completeness_data['completenessIndex'].mean():.2f}%")
-print(f"   ✓ Completitud mínima: {completeness_data['completenessIndex'].min():.2f}%")
-print(f"   ✓ Completitud màxima: {completeness_data['completenessIndex'].max():.2f}%")
-
 # ============================================================================
 # MÈTRIQUES: Índex de Diversitat de Mètodes de Mostreig
 # ============================================================================
-print("\n7. Calculant Índex de Diversitat de Mètodes de Mostreig...")
 
 def calculate_method_diversity_index(df):
     """Calcula l'índex de diversitat de mètodes de mostreig per regió (índex de Shannon)"""
@@ -344,17 +494,9 @@ def calculate_method_diversity_index(df):
     
     return pd.DataFrame(diversity_results).sort_values('normalizedDiversity', ascending=False)
 
-method_diversity = calculate_method_diversity_index(microplastics)
-print(f"   ✓ Diversitat calculada per {len(method_diversity)} regions")
-if len(method_diversity) > 0:
-    print(f"   ✓ Diversitat mitjana: {method_diversity['normalizedDiversity'].mean():.3f}")
-    print(f"   ✓ Diversitat mínima: {method_diversity['normalizedDiversity'].min():.3f}")
-    print(f"   ✓ Diversitat màxima: {method_diversity['normalizedDiversity'].max():.3f}")
-
 # ============================================================================
 # MÈTRIQUES: IGRM Simplificat (Índex Global de Risc de Microplàstics)
 # ============================================================================
-print("\n8. Calculant IGRM Simplificat...")
 
 def calculate_IGRM_simplified(df, icr_data, completeness_data, method_diversity):
     """Calcula l'IGRM simplificat com a mètrica composta que integra altres mètriques"""
@@ -417,144 +559,198 @@ def calculate_IGRM_simplified(df, icr_data, completeness_data, method_diversity)
     
     return igrm_result.sort_values('IGRM', ascending=False)
 
-igrm_data = calculate_IGRM_simplified(microplastics, icr_data, completeness_data, method_diversity)
-print(f"   ✓ IGRM calculat per {len(igrm_data)} regions")
-if len(igrm_data) > 0:
-    print(f"   ✓ IGRM mitjà: {igrm_data['IGRM'].mean():.3f}")
-    print(f"   ✓ IGRM mínim: {igrm_data['IGRM'].min():.3f}")
-    print(f"   ✓ IGRM màxim: {igrm_data['IGRM'].max():.3f}")
+def compute_metrics(microplastics):
+    """Calcula totes les mètriques per regió i per any"""
+    print("\n3. Calculant Índex de Contaminació Regional (ICR)...")
+    icr_data = calculate_ICR(microplastics)
+    print(f"   ✓ ICR calculat per {len(icr_data)} regions")
+
+    print("\n4. Calculant Taxa de Canvi Temporal (TCT)...")
+    by_year = calculate_TCT(microplastics)
+    print(f"   ✓ TCT calculat per {len(by_year)} anys")
+    by_year_region = calculate_TCT_by_region(microplastics)
+    print(f"   ✓ TCT per regió calculat per {len(by_year_region)} combinacions any-regió")
+
+    print("\n5. Calculant correlació profunditat-concentració...")
+    depth_corr = calculate_depth_correlation(microplastics)
+    print(f"   ✓ Correlació: {depth_corr['correlation']} ({depth_corr['strength']})")
+
+    print("\n6. Calculant Índex de Completitud de Dades per Regió...")
+    completeness_data = calculate_data_completeness(microplastics)
+    print(f"   ✓ Completitud calculada per {len(completeness_data)} regions")
+    print(f"   ✓ Completitud mitjana: {completeness_data['completenessIndex'].mean():.2f}%")
+    print(f"   ✓ Completitud mínima: {completeness_data['completenessIndex'].min():.2f}%")
+    print(f"   ✓ Completitud màxima: {completeness_data['completenessIndex'].max():.2f}%")
+
+    print("\n7. Calculant Índex de Diversitat de Mètodes de Mostreig...")
+    method_diversity = calculate_method_diversity_index(microplastics)
+    print(f"   ✓ Diversitat calculada per {len(method_diversity)} regions")
+    if len(method_diversity) > 0:
+        print(f"   ✓ Diversitat mitjana: {method_diversity['normalizedDiversity'].mean():.3f}")
+        print(f"   ✓ Diversitat mínima: {method_diversity['normalizedDiversity'].min():.3f}")
+        print(f"   ✓ Diversitat màxima: {method_diversity['normalizedDiversity'].max():.3f}")
+
+    print("\n8. Calculant IGRM Simplificat...")
+    igrm_data = calculate_IGRM_simplified(microplastics, icr_data, completeness_data, method_diversity)
+    print(f"   ✓ IGRM calculat per {len(igrm_data)} regions")
+    if len(igrm_data) > 0:
+        print(f"   ✓ IGRM mitjà: {igrm_data['IGRM'].mean():.3f}")
+        print(f"   ✓ IGRM mínim: {igrm_data['IGRM'].min():.3f}")
+        print(f"   ✓ IGRM màxim: {igrm_data['IGRM'].max():.3f}")
+
+    return {
+        'icr': icr_data,
+        'byYear': by_year,
+        'byYearRegion': by_year_region,
+        'depthCorrelation': depth_corr,
+        'completeness': completeness_data,
+        'methodDiversity': method_diversity,
+        'igrm': igrm_data
+    }
 
 # ============================================================================
 # PREPARAR DADES PER VISUALITZACIÓ
 # ============================================================================
-print("\n9. Preparant dades per visualització...")
-
-# 1. Dades agregades per regió
-by_region = microplastics.groupby(['Ocean', 'Region', 'Country'], dropna=False).agg({
-    'concentration': ['count', 'mean', 'median', 'std'],
-    'lat': ['min', 'max', 'mean'],
-    'lon': ['min', 'max', 'mean']
-}).reset_index()
-
-by_region.columns = ['ocean', 'region', 'country', 'nSamples', 'meanConcentration', 
-                      'medianConcentration', 'sdConcentration', 'minLat', 'maxLat', 
-                      'meanLat', 'minLon', 'maxLon', 'meanLon']
-
-# Afegir ICR
-by_region = by_region.merge(
-    icr_data[['ocean', 'region', 'ICR']],
-    on=['ocean', 'region'],
-    how='left'
-)
-
-# Afegir Completitud de Dades
-by_region = by_region.merge(
-    completeness_data[['ocean', 'region', 'completenessIndex', 'avgCompleteness', 'criticalCompleteness']],
-    on=['ocean', 'region'],
-    how='left'
-)
-
-by_region = by_region[by_region['meanLat'].notna() & by_region['meanLon'].notna()].copy()
-print(f"   ✓ Dades per regió: {len(by_region)} regions")
-
-# 2. Dades per a scatterplot (mostres individuals)
-scatter_data = microplastics[[
-    'concentration', 'depth', 'lat', 'lon', 'ocean', 'region', 'Year', 'method'
-]].copy()
-
-scatter_data = scatter_data[
-    (scatter_data['concentration'].notna()) &
-    (scatter_data['depth'].notna()) &
-    (scatter_data['depth'] > 0)
-].sample(min(1000, len(scatter_data))).copy()  # Limitar per rendiment
-
-print(f"   ✓ Dades scatterplot: {len(scatter_data)} mostres")
-
-# 3. Dades per box plot (mètodes de mostreig)
-method_data = microplastics[
-    (microplastics['method'].notna()) &
-    (microplastics['concentration'] > 0)
-].groupby('method')['concentration'].apply(lambda x: x.tolist()).reset_index()
-
-method_data.columns = ['method', 'concentrations']
-method_data = method_data[method_data['concentrations'].apply(len) > 0].copy()
-# Convertir llistes de numpy arrays a llistes de Python
-method_data['concentrations'] = method_data['concentrations'].apply(
-    lambda x: [float(val) for val in x if not (isinstance(val, float) and (np.isnan(val) or np.isinf(val)))]
-)
-
-print(f"   ✓ Dades per mètodes: {len(method_data)} mètodes")
-
-# 4. Dades per treemap (mètode i ambient marí)
-treemap_data = microplastics[
-    (microplastics['method'].notna()) &
-    (microplastics['marineSetting'].notna()) &
-    (microplastics['concentration'] > 0)
-].groupby(['method', 'marineSetting']).agg({
-    'concentration': ['count', 'mean']
-}).reset_index()
-
-treemap_data.columns = ['method', 'marineSetting', 'nSamples', 'meanConcentration']
-treemap_data = treemap_data.sort_values('nSamples', ascending=False)
-
-print(f"   ✓ Dades treemap: {len(treemap_data)} combinacions")
-
-# 5. Dades per parallel coordinates plot (mostres amb múltiples dimensions)
-parallel_data = microplastics[[
-    'concentration', 'depth', 'Year', 'ocean', 'method', 'marineSetting', 
-    'lat', 'lon', 'region'
-]].copy()
-
-parallel_data = parallel_data[
-    (parallel_data['concentration'].notna()) &
-    (parallel_data['concentration'] > 0)
-].sample(min(500, len(parallel_data))).copy()  # Limitar per rendiment
-
-# Normalitzar variables numèriques per parallel coordinates
-parallel_data['concentration_norm'] = (parallel_data['concentration'] - parallel_data['concentration'].min()) / (parallel_data['concentration'].max() - parallel_data['concentration'].min()) if parallel_data['concentration'].max() > parallel_data['concentration'].min() else 0
-parallel_data['depth_norm'] = parallel_data['depth'].apply(
-    lambda x: (x - microplastics['depth'].min()) / (microplastics['depth'].max() - microplastics['depth'].min()) if pd.notna(x) and microplastics['depth'].max() > microplastics['depth'].min() else None
-)
-parallel_data['year_norm'] = (parallel_data['Year'] - parallel_data['Year'].min()) / (parallel_data['Year'].max() - parallel_data['Year'].min()) if parallel_data['Year'].max() > parallel_data['Year'].min() else 0
-
-print(f"   ✓ Dades parallel coordinates: {len(parallel_data)} mostres")
-
-# 6. Dades per violin plots temporals (concentracions per any)
-violin_data = microplastics[
-    (microplastics['concentration'].notna()) &
-    (microplastics['concentration'] > 0) &
-    (microplastics['Year'].notna())
-].groupby('Year')['concentration'].apply(lambda x: x.tolist()).reset_index()
-violin_data.columns = ['year', 'concentrations']
-violin_data['concentrations'] = violin_data['concentrations'].apply(
-    lambda x: [float(val) for val in x if not (isinstance(val, float) and (np.isnan(val) or np.isinf(val)))]
-)
-violin_data = violin_data[violin_data['concentrations'].apply(len) > 0].copy()
-violin_data = violin_data.sort_values('year')
-
-print(f"   ✓ Dades violin plots: {len(violin_data)} anys")
-
-# 7. Dades per Sankey diagrams (flux: mètode → ambient marí → rang de concentració)
-# Crear rangs de concentració
-microplastics['concentration_range'] = pd.cut(
-    microplastics['concentration'],
-    bins=[0, 0.1, 0.5, 1.0, 5.0, float('inf')],
-    labels=['Molt Baixa (0-0.1)', 'Baixa (0.1-0.5)', 'Mitjana (0.5-1.0)', 'Alta (1.0-5.0)', 'Molt Alta (>5.0)']
-)
-
-sankey_data = microplastics[
-    (microplastics['method'].notna()) &
-    (microplastics['marineSetting'].notna()) &
-    (microplastics['concentration_range'].notna())
-].groupby(['method', 'marineSetting', 'concentration_range']).size().reset_index(name='count')
-sankey_data = sankey_data.sort_values('count', ascending=False)
-
-print(f"   ✓ Dades Sankey: {len(sankey_data)} combinacions")
+
+def build_visualization_data(microplastics, icr_data, completeness_data):
+    """Prepara els conjunts de dades per a cada visualització"""
+    print("\n9. Preparant dades per visualització...")
+
+    # 1. Dades agregades per regió
+    by_region = microplastics.groupby(['Ocean', 'Region', 'Country'], dropna=False).agg({
+        'concentration': ['count', 'mean', 'median', 'std'],
+        'lat': ['min', 'max', 'mean'],
+        'lon': ['min', 'max', 'mean']
+    }).reset_index()
+
+    by_region.columns = ['ocean', 'region', 'country', 'nSamples', 'meanConcentration', 
+                          'medianConcentration', 'sdConcentration', 'minLat', 'maxLat', 
+                          'meanLat', 'minLon', 'maxLon', 'meanLon']
+
+    # Afegir ICR
+    by_region = by_region.merge(
+        icr_data[['ocean', 'region', 'ICR']],
+        on=['ocean', 'region'],
+        how='left'
+    )
+
+    # Afegir Completitud de Dades
+    by_region = by_region.merge(
+        completeness_data[['ocean', 'region', 'completenessIndex', 'avgCompleteness', 'criticalCompleteness']],
+        on=['ocean', 'region'],
+        how='left'
+    )
+
+    by_region = by_region[by_region['meanLat'].notna() & by_region['meanLon'].notna()].copy()
+    print(f"   ✓ Dades per regió: {len(by_region)} regions")
+
+    # 2. Dades per a scatterplot (mostres individuals)
+    scatter_data = microplastics[[
+        'concentration', 'depth', 'lat', 'lon', 'ocean', 'region', 'Year', 'method'
+    ]].copy()
+
+    scatter_data = scatter_data[
+        (scatter_data['concentration'].notna()) &
+        (scatter_data['depth'].notna()) &
+        (scatter_data['depth'] > 0)
+    ].sample(min(1000, len(scatter_data)), random_state=SAMPLE_SEED).copy()  # Limitar per rendiment
+
+    print(f"   ✓ Dades scatterplot: {len(scatter_data)} mostres")
+
+    # 3. Dades per box plot (mètodes de mostreig)
+    method_data = microplastics[
+        (microplastics['method'].notna()) &
+        (microplastics['concentration'] > 0)
+    ].groupby('method')['concentration'].apply(lambda x: x.tolist()).reset_index()
+
+    method_data.columns = ['method', 'concentrations']
+    method_data = method_data[method_data['concentrations'].apply(len) > 0].copy()
+    # Convertir llistes de numpy arrays a llistes de Python
+    method_data['concentrations'] = method_data['concentrations'].apply(
+        lambda x: [float(val) for val in x if not (isinstance(val, float) and (np.isnan(val) or np.isinf(val)))]
+    )
+
+    print(f"   ✓ Dades per mètodes: {len(method_data)} mètodes")
+
+    # 4. Dades per treemap (mètode i ambient marí)
+    treemap_data = microplastics[
+        (microplastics['method'].notna()) &
+        (microplastics['marineSetting'].notna()) &
+        (microplastics['concentration'] > 0)
+    ].groupby(['method', 'marineSetting']).agg({
+        'concentration': ['count', 'mean']
+    }).reset_index()
+
+    treemap_data.columns = ['method', 'marineSetting', 'nSamples', 'meanConcentration']
+    treemap_data = treemap_data.sort_values('nSamples', ascending=False)
+
+    print(f"   ✓ Dades treemap: {len(treemap_data)} combinacions")
+
+    # 5. Dades per parallel coordinates plot (mostres amb múltiples dimensions)
+    parallel_data = microplastics[[
+        'concentration', 'depth', 'Year', 'ocean', 'method', 'marineSetting', 
+        'lat', 'lon', 'region'
+    ]].copy()
+
+    parallel_data = parallel_data[
+        (parallel_data['concentration'].notna()) &
+        (parallel_data['concentration'] > 0)
+    ].sample(min(500, len(parallel_data)), random_state=SAMPLE_SEED).copy()  # Limitar per rendiment
+
+    # Normalitzar variables numèriques per parallel coordinates
+    parallel_data['concentration_norm'] = (parallel_data['concentration'] - parallel_data['concentration'].min()) / (parallel_data['concentration'].max() - parallel_data['concentration'].min()) if parallel_data['concentration'].max() > parallel_data['concentration'].min() else 0
+    parallel_data['depth_norm'] = parallel_data['depth'].apply(
+        lambda x: (x - microplastics['depth'].min()) / (microplastics['depth'].max() - microplastics['depth'].min()) if pd.notna(x) and microplastics['depth'].max() > microplastics['depth'].min() else None
+    )
+    parallel_data['year_norm'] = (parallel_data['Year'] - parallel_data['Year'].min()) / (parallel_data['Year'].max() - parallel_data['Year'].min()) if parallel_data['Year'].max() > parallel_data['Year'].min() else 0
+
+    print(f"   ✓ Dades parallel coordinates: {len(parallel_data)} mostres")
+
+    # 6. Dades per violin plots temporals (concentracions per any)
+    violin_data = microplastics[
+        (microplastics['concentration'].notna()) &
+        (microplastics['concentration'] > 0) &
+        (microplastics['Year'].notna())
+    ].groupby('Year')['concentration'].apply(lambda x: x.tolist()).reset_index()
+    violin_data.columns = ['year', 'concentrations']
+    violin_data['concentrations'] = violin_data['concentrations'].apply(
+        lambda x: [float(val) for val in x if not (isinstance(val, float) and (np.isnan(val) or np.isinf(val)))]
+    )
+    violin_data = violin_data[violin_data['concentrations'].apply(len) > 0].copy()
+    violin_data = violin_data.sort_values('year')
+
+    print(f"   ✓ Dades violin plots: {len(violin_data)} anys")
+
+    # 7. Dades per Sankey diagrams (flux: mètode → ambient marí → rang de concentració)
+    # Crear rangs de concentració
+    microplastics['concentration_range'] = pd.cut(
+        microplastics['concentration'],
+        bins=[0, 0.1, 0.5, 1.0, 5.0, float('inf')],
+        labels=['Molt Baixa (0-0.1)', 'Baixa (0.1-0.5)', 'Mitjana (0.5-1.0)', 'Alta (1.0-5.0)', 'Molt Alta (>5.0)']
+    )
+
+    sankey_data = microplastics[
+        (microplastics['method'].notna()) &
+        (microplastics['marineSetting'].notna()) &
+        (microplastics['concentration_range'].notna())
+    ].groupby(['method', 'marineSetting', 'concentration_range']).size().reset_index(name='count')
+    sankey_data = sankey_data.sort_values('count', ascending=False)
+
+    print(f"   ✓ Dades Sankey: {len(sankey_data)} combinacions")
+
+    return {
+        'byRegion': by_region,
+        'scatter': scatter_data,
+        'method': method_data,
+        'treemap': treemap_data,
+        'parallel': parallel_data,
+        'violin': violin_data,
+        'sankey': sankey_data
+    }
 
 # ============================================================================
 # EXPORTAR A JSON
 # ============================================================================
-print("\n10. Exportant a JSON...")
 
 def to_json_serializable(obj):
     """Converteix a format JSON serializable"""
@@ -600,9 +796,9 @@ def to_json_serializable(obj):
     return obj
 
 # Funció helper per exportar
-def export_json(data, filename):
-    """Exporta dades a JSON"""
-    filepath = DATA_PROCESSED / filename
+def export_json(data, filename, out_dir=DATA_PROCESSED, verbose=True):
+    """Exporta dades a JSON. Retorna False si el fitxer ja tenia el mateix contingut"""
+    filepath = Path(out_dir) / filename
     
     if isinstance(data, pd.DataFrame):
         data_dict = data.to_dict('records')
@@ -639,64 +835,350 @@ def export_json(data, filename):
     
     cleaned = remove_nan(cleaned)
     
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(cleaned, f, indent=2, ensure_ascii=False, allow_nan=False)
-    
-    print(f"   ✓ {filename}")
-
-# Exportar cada dataset
-export_json(by_region, 'by_region.json')
-# Convertir by_year a llista de diccionaris abans d'exportar
-by_year_dict = by_year.to_dict('records') if isinstance(by_year, pd.DataFrame) else by_year
-export_json(by_year_dict, 'by_year.json')
-
-# Convertir by_year_region a llista de diccionaris abans d'exportar
-by_year_region_dict = by_year_region.to_dict('records') if isinstance(by_year_region, pd.DataFrame) else by_year_region
-export_json(by_year_region_dict, 'by_year_region.json')
-export_json(scatter_data.to_dict('records'), 'scatter_data.json')
-export_json(method_data.to_dict('records'), 'method_data.json')
-export_json(treemap_data, 'treemap_data.json')
-export_json(parallel_data.to_dict('records'), 'parallel_data.json')
-export_json(violin_data.to_dict('records'), 'violin_data.json')
-export_json(sankey_data.to_dict('records'), 'sankey_data.json')
-
-# Exportar mètriques
-metrics = {
-    'ICR': icr_data.to_dict('records'),
-    'depthCorrelation': depth_corr,
-    'dataCompleteness': completeness_data.to_dict('records'),
-    'methodDiversity': method_diversity.to_dict('records'),
-    'IGRM': igrm_data.to_dict('records'),
-    'summary': {
-        'totalSamples': len(microplastics),
-        'dateRange': {
-            'min': microplastics['Date_parsed'].min().isoformat() if microplastics['Date_parsed'].notna().any() else None,
-            'max': microplastics['Date_parsed'].max().isoformat() if microplastics['Date_parsed'].notna().any() else None
-        },
-        'nRegions': microplastics['region'].nunique(),
-        'nOceans': microplastics['ocean'].nunique(),
-        'nCountries': microplastics['country'].nunique(),
-        'avgCompleteness': float(completeness_data['completenessIndex'].mean()) if len(completeness_data) > 0 else None,
-        'avgMethodDiversity': float(method_diversity['normalizedDiversity'].mean()) if len(method_diversity) > 0 else None,
-        'avgIGRM': float(igrm_data['IGRM'].mean()) if len(igrm_data) > 0 else None
+    content = json.dumps(cleaned, indent=2, ensure_ascii=False, allow_nan=False)
+    
+    # No reescriure fitxers idèntics (evita recàrregues innecessàries en mode watch)
+    if filepath.exists() and filepath.read_text(encoding='utf-8') == content:
+        if verbose:
+            print(f"   = {filename} (sense canvis)")
+        return False
+    
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    filepath.write_text(content, encoding='utf-8')
+    if verbose:
+        print(f"   ✓ {filename}")
+    return True
+
+def build_outputs(microplastics, quality_report):
+    """Calcula mètriques i dades de visualització. Retorna {nom de fitxer: dades}"""
+    m = compute_metrics(microplastics)
+    viz = build_visualization_data(microplastics, m['icr'], m['completeness'])
+    
+    icr_data = m['icr']
+    completeness_data = m['completeness']
+    method_diversity = m['methodDiversity']
+    igrm_data = m['igrm']
+    
+    metrics = {
+        'ICR': icr_data.to_dict('records'),
+        'depthCorrelation': m['depthCorrelation'],
+        'dataCompleteness': completeness_data.to_dict('records'),
+        'methodDiversity': method_diversity.to_dict('records'),
+        'IGRM': igrm_data.to_dict('records'),
+        'summary': {
+            'totalSamples': len(microplastics),
+            'dateRange': {
+                'min': microplastics['Date_parsed'].min().isoformat() if microplastics['Date_parsed'].notna().any() else None,
+                'max': microplastics['Date_parsed'].max().isoformat() if microplastics['Date_parsed'].notna().any() else None
+            },
+            'nRegions': microplastics['region'].nunique(),
+            'nOceans': microplastics['ocean'].nunique(),
+            'nCountries': microplastics['country'].nunique(),
+            'avgCompleteness': float(completeness_data['completenessIndex'].mean()) if len(completeness_data) > 0 else None,
+            'avgMethodDiversity': float(method_diversity['normalizedDiversity'].mean()) if len(method_diversity) > 0 else None,
+            'avgIGRM': float(igrm_data['IGRM'].mean()) if len(igrm_data) > 0 else None
+        }
+    }
+    
+    return {
+        'by_region.json': viz['byRegion'],
+        'by_year.json': m['byYear'],
+        'by_year_region.json': m['byYearRegion'],
+        'scatter_data.json': viz['scatter'],
+        'method_data.json': viz['method'],
+        'treemap_data.json': viz['treemap'],
+        'parallel_data.json': viz['parallel'],
+        'violin_data.json': viz['violin'],
+        'sankey_data.json': viz['sankey'],
+        'metrics.json': metrics,
+        'quality_report.json': quality_report
+    }
+
+def export_outputs(outputs, out_dir=DATA_PROCESSED):
+    """Exporta tots els conjunts de dades. Retorna la llista de fitxers modificats"""
+    print("\n10. Exportant a JSON...")
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    return [filename for filename, data in outputs.items() if export_json(data, filename, out_dir)]
+
+def shard_name(key):
+    """Nom de fitxer segur per a la clau d'un shard (p. ex. 1990.0 → '1990')"""
+    if isinstance(key, (float, np.floating)) and float(key).is_integer():
+        key = int(key)
+    return re.sub(r'[^A-Za-z0-9]+', '-', str(key)).strip('-').lower() or 'buit'
+
+def value_stats(values):
+    """Estadístiques resum d'una llista de valors numèrics"""
+    values = pd.Series(values, dtype='float64').dropna()
+    if len(values) == 0:
+        return {'nValues': 0}
+    return {
+        'nValues': int(len(values)),
+        'min': float(values.min()),
+        'median': float(values.median()),
+        'max': float(values.max())
+    }
+
+def dataset_stats(data):
+    """Files i estadístiques (min/max/mitjana) de les columnes numèriques d'un conjunt"""
+    if not isinstance(data, pd.DataFrame):
+        return None, None
+    stats = {}
+    for column in data.select_dtypes(include='number').columns:
+        values = data[column].replace([np.inf, -np.inf], np.nan).dropna()
+        if len(values) > 0:
+            stats[column] = {'min': float(values.min()), 'max': float(values.max()), 'mean': float(values.mean())}
+    return len(data), stats
+
+def export_shards(outputs, out_dir=DATA_PROCESSED):
+    """Divideix els conjunts de SHARDED_DATASETS en un fitxer per clau.
+
+    Retorna {fitxer del conjunt: [entrades de shard per al manifest]}. Els shards
+    de claus que ja no existeixen s'eliminen.
+    """
+    shards = {}
+    for filename, key_column in SHARDED_DATASETS.items():
+        data = outputs.get(filename)
+        if not isinstance(data, pd.DataFrame):
+            continue
+        shard_dir = Path(out_dir) / SHARDS_DIR / Path(filename).stem
+        entries, written, used_names = [], 0, set()
+        for record in data.to_dict('records'):
+            key = record[key_column]
+            name = shard_name(key)
+            # Claus diferents que donen el mateix nom de fitxer
+            while name in used_names:
+                name += '_'
+            used_names.add(name)
+            shard_file = f"{SHARDS_DIR}/{Path(filename).stem}/{name}.json"
+            written += export_json(record, shard_file, out_dir, verbose=False)
+            entry = {
+                'key': to_json_serializable(key),
+                'file': shard_file,
+                'bytes': (Path(out_dir) / shard_file).stat().st_size
+            }
+            entry.update(value_stats(record.get('concentrations', [])))
+            entries.append(entry)
+        if shard_dir.exists():
+            for stale in shard_dir.glob('*.json'):
+                if stale.stem not in used_names:
+                    stale.unlink()
+        shards[filename] = entries
+        print(f"   ✓ {SHARDS_DIR}/{Path(filename).stem}/ ({len(entries)} shards, {written} modificats)")
+    return shards
+
+def export_manifest(outputs, shards, out_dir=DATA_PROCESSED):
+    """Escriu manifest.json amb mida, files i estadístiques de cada conjunt de dades.
+
+    El frontend el carrega primer per decidir què descarrega i quan.
+    """
+    datasets = {}
+    for filename, data in outputs.items():
+        rows, stats = dataset_stats(data)
+        entry = {
+            'file': filename,
+            'bytes': (Path(out_dir) / filename).stat().st_size,
+            'rows': rows
+        }
+        if stats:
+            entry['stats'] = stats
+        if filename in shards:
+            entry['shardKey'] = SHARDED_DATASETS[filename]
+            entry['shards'] = shards[filename]
+        datasets[filename] = entry
+    return export_json({'datasets': datasets}, 'manifest.json', out_dir)
+
+def print_banner():
+    """Capçalera de l'execució del pipeline"""
+    print("=" * 60)
+    print("PROCESSAMENT DE DADES DE MICROPLÀSTICS")
+    print("=" * 60)
+
+def run(csv_file=CSV_FILE, out_dir=DATA_PROCESSED, raw=None, history_db=HISTORY_DB, history_series=None):
+    """Executa el pipeline complet. Si es passa `raw`, no es torna a llegir el CSV
+    (qui crida ja l'ha carregat i ha mostrat la capçalera).
+    Les mètriques per regió s'afegeixen a l'històric excepte si `history_db` és None,
+    dins la sèrie `history_series` (per defecte, el nom del CSV sense extensió).
+
+    Retorna (sortides, fitxers modificats).
+    """
+    if raw is None:
+        print_banner()
+        raw = load_data(csv_file)
+    microplastics, quality_report = prepare_data(raw, Path(csv_file).name)
+    outputs = build_outputs(microplastics, quality_report)
+    changed = export_outputs(outputs, out_dir)
+    shards = export_shards(outputs, out_dir)
+    if export_manifest(outputs, shards, out_dir):
+        changed.append('manifest.json')
+    
+    if history_db is not None:
+        run_id = record_run(outputs['metrics.json'], Path(csv_file).name, history_db, series=history_series)
+        print(f"   ✓ Mètriques afegides a l'històric (execució {run_id}): {history_db}")
+    
+    print("\n" + "=" * 60)
+    print("✓ PROCESSAMENT COMPLETAT")
+    print("=" * 60)
+    print(f"\nFitxers generats a: {out_dir}")
+    print("\nFitxers JSON generats:")
+    for filename in outputs:
+        print(f"  - {filename}")
+    print("  - manifest.json")
+    for filename in shards:
+        print(f"  - {SHARDS_DIR}/{Path(filename).stem}/*.json")
+    print("\nAra pots carregar aquests fitxers a la visualització JavaScript!")
+    
+    return outputs, changed
+
+# ============================================================================
+# MODE BATCH: múltiples snapshots en una sola invocació
+# ============================================================================
+
+def expand_inputs(patterns):
+    """Expandeix una llista de CSVs o patrons glob a una llista de fitxers"""
+    csv_files = []
+    for pattern in patterns:
+        is_glob = any(char in str(pattern) for char in '*?[')
+        matches = sorted(glob.glob(str(pattern))) if is_glob else [pattern]
+        if not matches:
+            print(f"   ! Cap fitxer coincideix amb {pattern}")
+        csv_files += [Path(match) for match in matches]
+    return csv_files
+
+# Camps del resum que es promitgen entre snapshots ponderant per nombre de mostres
+WEIGHTED_SUMMARY_FIELDS = ['avgCompleteness', 'avgMethodDiversity', 'avgIGRM']
+# Columnes de by_region.json i camp del resum amb el nombre de valors diferents
+DISTINCT_SUMMARY_FIELDS = {'region': 'nRegions', 'ocean': 'nOceans', 'country': 'nCountries'}
+
+def process_snapshot(csv_file, out_dir, history_db=HISTORY_DB, history_series=None):
+    """Processa un snapshot i en retorna el resum (s'executa al procés principal o en un worker)"""
+    outputs, _ = run(csv_file, out_dir, history_db=history_db, history_series=history_series)
+    report = outputs['quality_report.json']
+    by_region = outputs['by_region.json']
+    return {
+        'name': Path(csv_file).stem,
+        'csv': str(csv_file),
+        'outDir': str(out_dir),
+        'summary': outputs['metrics.json']['summary'],
+        'quality': {key: report[key] for key in ('totalRows', 'validRows', 'droppedRows')},
+        # Valors diferents per poder comptar-los entre snapshots; run_batch els treu del resum
+        'distinct': {column: sorted(by_region[column].dropna().unique().tolist()) for column in DISTINCT_SUMMARY_FIELDS}
     }
-}
 
-export_json(metrics, 'metrics.json')
-
-print("\n" + "=" * 60)
-print("✓ PROCESSAMENT COMPLETAT")
-print("=" * 60)
-print(f"\nFitxers generats a: {DATA_PROCESSED}")
-print("\nFitxers JSON generats:")
-print("  - by_region.json")
-print("  - by_year.json")
-print("  - by_year_region.json")
-print("  - scatter_data.json")
-print("  - method_data.json")
-print("  - treemap_data.json")
-print("  - parallel_data.json")
-print("  - violin_data.json")
-print("  - sankey_data.json")
-print("  - metrics.json")
-print("\nAra pots carregar aquests fitxers a la visualització JavaScript!")
+def combine_summaries(snapshots):
+    """Agrega els `metrics['summary']` de tots els snapshots processats correctament.
+
+    Els comptadors de regions, oceans i països són valors diferents en el
+    conjunt de snapshots (una regió present a tots compta una vegada). Les
+    mitjanes es ponderen pel nombre de mostres de cada snapshot.
+    """
+    ok = [s for s in snapshots if 'summary' in s]
+    summaries = [s['summary'] for s in ok]
+    date_mins = [s['dateRange']['min'] for s in summaries if s['dateRange']['min']]
+    date_maxs = [s['dateRange']['max'] for s in summaries if s['dateRange']['max']]
+    combined = {
+        'nSnapshots': len(snapshots),
+        'nFailed': len(snapshots) - len(ok),
+        'totalSamples': sum(s['totalSamples'] for s in summaries),
+        'dateRange': {
+            'min': min(date_mins) if date_mins else None,
+            'max': max(date_maxs) if date_maxs else None
+        }
+    }
+    for column, field in DISTINCT_SUMMARY_FIELDS.items():
+        combined[field] = len(set().union(*(s['distinct'][column] for s in ok)))
+    for field in WEIGHTED_SUMMARY_FIELDS:
+        pairs = [(s[field], s['totalSamples']) for s in summaries if s.get(field) is not None and s['totalSamples']]
+        weight = sum(w for _, w in pairs)
+        combined[field] = sum(v * w for v, w in pairs) / weight if weight else None
+    return combined
+
+def run_batch(csv_files, out_root=BATCH_OUT_ROOT, workers=1, history_db=HISTORY_DB, history_series=None):
+    """Processa diversos CSVs en un sol procés o en un pool de workers.
+
+    Cada snapshot s'escriu a `out_root/<nom del CSV>/` i s'afegeix un resum
+    combinat a `out_root/batch_summary.json`. Un snapshot que falla no atura
+    la resta; l'error queda registrat al resum.
+    """
+    out_root = Path(out_root)
+    names = [Path(csv_file).stem for csv_file in csv_files]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Snapshots amb el mateix nom de fitxer: {', '.join(duplicates)}")
+
+    jobs = [(Path(csv_file), out_root / name) for csv_file, name in zip(csv_files, names)]
+    snapshots = []
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(process_snapshot, csv_file, out_dir, history_db, history_series) for csv_file, out_dir in jobs]
+            for (csv_file, _), future in zip(jobs, futures):
+                try:
+                    snapshots.append(future.result())
+                except Exception as e:
+                    print(f"   ✗ Error processant {csv_file}: {e}")
+                    snapshots.append({'name': csv_file.stem, 'csv': str(csv_file), 'error': str(e)})
+    else:
+        # Al mateix procés, els snapshots comparteixen imports i la taula de dates
+        for csv_file, out_dir in jobs:
+            try:
+                snapshots.append(process_snapshot(csv_file, out_dir, history_db, history_series))
+            except Exception as e:
+                print(f"   ✗ Error processant {csv_file}: {e}")
+                snapshots.append({'name': csv_file.stem, 'csv': str(csv_file), 'error': str(e)})
+
+    combined = combine_summaries(snapshots)
+    for snapshot in snapshots:
+        snapshot.pop('distinct', None)
+    batch_summary = {
+        'generatedAt': datetime.now().isoformat(),
+        'combined': combined,
+        'snapshots': snapshots
+    }
+    out_root.mkdir(parents=True, exist_ok=True)
+    export_json(batch_summary, 'batch_summary.json', out_root)
+    return batch_summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Processa les dades de microplàstics i genera els JSON de la visualització")
+    parser.add_argument('--batch', nargs='+', metavar='CSV',
+                        help="CSVs o patrons glob a processar en una sola invocació")
+    parser.add_argument('--out-root', type=Path, default=BATCH_OUT_ROOT,
+                        help="Directori arrel de sortida del mode batch (un subdirectori per snapshot)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Nombre de processos del mode batch (1 = tot al mateix procés)")
+    parser.add_argument('--no-history', action='store_true',
+                        help="No afegir les mètriques d'aquesta execució a l'històric")
+    parser.add_argument('--history-series', metavar='NOM',
+                        help="Sèrie de l'històric on es desen les execucions (per defecte, el nom de cada CSV)")
+    args = parser.parse_args()
+    history_db = None if args.no_history else HISTORY_DB
+
+    if args.batch:
+        csv_files = expand_inputs(args.batch)
+        if not csv_files:
+            print("   ✗ Error: cap CSV per processar")
+            sys.exit(1)
+        try:
+            batch_summary = run_batch(csv_files, args.out_root, args.workers, history_db, args.history_series)
+        except ValueError as e:
+            print(f"   ✗ Error: {e}")
+            sys.exit(1)
+        combined = batch_summary['combined']
+        print(f"\n✓ Batch completat: {combined['nSnapshots'] - combined['nFailed']}/{combined['nSnapshots']} snapshots "
+              f"({combined['totalSamples']} mostres) → {args.out_root / 'batch_summary.json'}")
+        if combined['nFailed']:
+            sys.exit(1)
+        return
+
+    print_banner()
+    try:
+        raw = load_data()
+    except FileNotFoundError:
+        print(f"   ✗ Error: No s'ha trobat el fitxer {CSV_FILE}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"   ✗ Error carregant dades: {e}")
+        sys.exit(1)
+    run(raw=raw, history_db=history_db, history_series=args.history_series)
+
+if __name__ == '__main__':
+    main()
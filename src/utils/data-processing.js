@@ -1,55 +1,111 @@
 // Utilitats per carregar dades preprocessades
 // Les dades han estat processades prèviament amb process_data.py
 
+const DATA_DIR = 'data/processed/';
+
+// Conjunts necessaris per al primer render (mapa, evolució temporal, mètriques)
+const EAGER_DATASETS = {
+    byRegion: 'by_region.json',
+    byYear: 'by_year.json',
+    byYearRegion: 'by_year_region.json',
+    treemapData: 'treemap_data.json',
+    metrics: 'metrics.json'
+};
+
+// Conjunts grans que només es descarreguen quan el gràfic que els fa servir és visible
+const LAZY_DATASETS = {
+    scatterData: 'scatter_data.json',
+    methodData: 'method_data.json',
+    parallelData: 'parallel_data.json',
+    violinData: 'violin_data.json',
+    sankeyData: 'sankey_data.json'
+};
+
+async function fetchJSON(file) {
+    const response = await fetch(DATA_DIR + file);
+    if (!response.ok) {
+        throw new Error(`${file}: HTTP ${response.status}`);
+    }
+    return response.json();
+}
+
+/**
+ * Carrega el manifest amb la mida, files, estadístiques i shards de cada conjunt.
+ * Retorna null si no existeix (dades generades amb una versió anterior del script)
+ */
+export async function loadManifest() {
+    try {
+        return await fetchJSON('manifest.json');
+    } catch (error) {
+        console.warn("No s'ha trobat manifest.json; es carregaran els fitxers sencers", error);
+        return null;
+    }
+}
+
 /**
- * Carrega les dades preprocessades des dels fitxers JSON
+ * Crea un carregador per cada conjunt de LAZY_DATASETS.
+ * Cada carregador retorna una promesa amb les files. Sense claus es descarrega
+ * el fitxer sencer en una sola petició; si el conjunt té shards es poden
+ * demanar només algunes claus (p. ex. violinData([2019, 2020])).
+ * Les descàrregues es reutilitzen entre gràfics. El manifest es rep com a
+ * promesa i només s'espera quan es demanen claus concretes.
+ */
+function createLazyLoaders(manifestPromise) {
+    const cache = new Map();
+    const cachedFetch = file => {
+        if (!cache.has(file)) {
+            cache.set(file, fetchJSON(file));
+        }
+        return cache.get(file);
+    };
+    
+    const loaders = {};
+    for (const [key, file] of Object.entries(LAZY_DATASETS)) {
+        loaders[key] = async (keys = null) => {
+            if (!keys) {
+                return cachedFetch(file);
+            }
+            const manifest = await manifestPromise;
+            const shards = manifest?.datasets?.[file]?.shards;
+            if (!shards) {
+                return cachedFetch(file);
+            }
+            const selected = shards.filter(s => keys.includes(s.key));
+            return Promise.all(selected.map(s => cachedFetch(s.file)));
+        };
+    }
+    return loaders;
+}
+
+/**
+ * Carrega les dades preprocessades des dels fitxers JSON.
+ * Només es descarreguen els conjunts necessaris per al primer render; la resta
+ * queda disponible a `lazy` per carregar-la sota demanda.
+ * El manifest es descarrega en paral·lel i `manifest` és una promesa.
  */
 export async function loadData() {
     try {
-        // Carregar tots els fitxers JSON en paral·lel
-        const [
-            byRegion,
-            byYear,
-            byYearRegion,
-            scatterData,
-            methodData,
-            treemapData,
-            parallelData,
-            violinData,
-            sankeyData,
-            metrics
-        ] = await Promise.all([
-            fetch('data/processed/by_region.json').then(r => r.json()),
-            fetch('data/processed/by_year.json').then(r => r.json()),
-            fetch('data/processed/by_year_region.json').then(r => r.json()),
-            fetch('data/processed/scatter_data.json').then(r => r.json()),
-            fetch('data/processed/method_data.json').then(r => r.json()),
-            fetch('data/processed/treemap_data.json').then(r => r.json()),
-            fetch('data/processed/parallel_data.json').then(r => r.json()),
-            fetch('data/processed/violin_data.json').then(r => r.json()),
-            fetch('data/processed/sankey_data.json').then(r => r.json()),
-            fetch('data/processed/metrics.json').then(r => r.json())
-        ]);
+        // El manifest només el necessiten els carregadors sota demanda: no s'espera aquí
+        const manifest = loadManifest();
+        
+        // Carregar els conjunts inicials en paral·lel
+        const entries = await Promise.all(
+            Object.entries(EAGER_DATASETS).map(async ([key, file]) => [key, await fetchJSON(file)])
+        );
+        const data = Object.fromEntries(entries);
+        const { byRegion, byYear, metrics } = data;
         
         console.log("Dades preprocessades carregades:");
         console.log(`  - ${byRegion.length} regions`);
         console.log(`  - ${byYear.length} anys`);
-        console.log(`  - ${scatterData.length} mostres per scatterplot`);
-        console.log(`  - ${methodData.length} mètodes de mostreig`);
         console.log(`  - Metrics keys:`, metrics ? Object.keys(metrics) : 'No metrics');
         console.log(`  - DataCompleteness:`, metrics?.dataCompleteness ? `${metrics.dataCompleteness.length} regions` : 'No disponible');
+        console.log(`  - Sota demanda: ${Object.keys(LAZY_DATASETS).join(', ')}`);
         
         return {
-            byRegion,
-            byYear,
-            byYearRegion,
-            scatterData,
-            methodData,
-            treemapData,
-            parallelData,
-            violinData,
-            sankeyData,
-            metrics
+            ...data,
+            manifest,
+            lazy: createLazyLoaders(manifest)
         };
         
     } catch (error) {
@@ -58,6 +114,45 @@ export async function loadData() {
     }
 }
 
+/**
+ * Reserva un espai per a un gràfic i el dibuixa quan entra a la pantalla.
+ * `load` retorna una promesa amb les dades; `render(slot, dades)` dibuixa el gràfic.
+ */
+export function renderWhenVisible(container, load, render, minHeight = 400) {
+    const slot = container.append('div')
+        .attr('class', 'lazy-chart')
+        .style('min-height', `${minHeight}px`);
+    slot.append('div')
+        .attr('class', 'loading')
+        .text('Carregant dades...');
+    
+    const start = () => load()
+        .then(data => {
+            slot.html('').style('min-height', null);
+            render(slot, data);
+        })
+        .catch(error => {
+            console.error("Error carregant dades sota demanda:", error);
+            slot.html(`<div class="error">Error carregant dades: ${error.message}</div>`);
+        });
+    
+    if (!('IntersectionObserver' in window)) {
+        start();
+        return slot;
+    }
+    
+    // Començar la descàrrega una mica abans que el gràfic sigui visible
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            observer.disconnect();
+            start();
+        }
+    }, { rootMargin: '300px 0px' });
+    observer.observe(slot.node());
+    
+    return slot;
+}
+
 /**
  * Organitza les dades per a les visualitzacions
  * Les dades ja estan processades, només cal organitzar-les
@@ -102,6 +197,10 @@ export function processData(data) {
             violinData: data.violinData || []
         },
         
+        // Carregadors dels conjunts grans (vegeu renderWhenVisible)
+        lazy: data.lazy,
+        manifest: data.manifest, // promesa (null si no hi ha manifest.json)
+        
         // Mètriques generals
         metrics: data.metrics,
         
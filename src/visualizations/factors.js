@@ -2,6 +2,7 @@
 // d3 està disponible globalment des de index.html
 
 import { createMethodViolinPlot, createTreemapViz, createParallelCoordinates } from './factors-extended.js';
+import { renderWhenVisible } from '../utils/data-processing.js';
 
 export function initFactorsViz(selector, processedData) {
     const container = d3.select(selector);
@@ -13,7 +14,11 @@ export function initFactorsViz(selector, processedData) {
         .attr('class', 'factors-content');
     
     // Inicialitzar totes les visualitzacions en ordre
-    createMethodViolinPlot(contentContainer, processedData);
+    // (els conjunts grans es carreguen quan el gràfic és visible)
+    renderWhenVisible(contentContainer, () => processedData.lazy.methodData(), (slot, methodData) => {
+        processedData.factors.methodData = methodData;
+        createMethodViolinPlot(slot, processedData);
+    }, 500);
     
     // Afegir separador visual
     contentContainer.append('hr')
@@ -45,7 +50,10 @@ export function initFactorsViz(selector, processedData) {
         .style('border', 'none')
         .style('border-top', '2px solid #e0e0e0');
     
-    createParallelCoordinates(contentContainer, processedData);
+    renderWhenVisible(contentContainer, () => processedData.lazy.parallelData(), (slot, parallelData) => {
+        processedData.factors.parallelData = parallelData;
+        createParallelCoordinates(slot, processedData);
+    }, 500);
 }
 
 // Funció eliminada: createDepthScatter - eliminat per ser redundant (correlació molt feble)
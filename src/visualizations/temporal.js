@@ -2,6 +2,7 @@
 // d3 està disponible globalment des de index.html
 
 import { createStreamgraphViz, createViolinPlots, createRidgelinePlots } from './temporal-extended.js';
+import { renderWhenVisible } from '../utils/data-processing.js';
 
 export function initTemporalViz(selector, processedData) {
     const container = d3.select(selector);
@@ -43,8 +44,11 @@ export function initTemporalViz(selector, processedData) {
         .style('font-size', '14px')
         .text('Visualitzacions detallades de la distribució de concentracions per any.');
     
-    // Afegir violin plots
-    createViolinPlots(contentContainer, processedData);
+    // Afegir violin plots (les dades per any es carreguen quan el gràfic és visible)
+    renderWhenVisible(contentContainer, () => processedData.lazy.violinData(), (slot, violinData) => {
+        processedData.temporalAdvanced.violinData = violinData;
+        createViolinPlots(slot, processedData);
+    }, 500);
     
     // Afegir separador visual
     contentContainer.append('hr')
@@ -52,8 +56,11 @@ export function initTemporalViz(selector, processedData) {
         .style('border', 'none')
         .style('border-top', '2px solid #e0e0e0');
     
-    // Afegir ridgeline plots
-    createRidgelinePlots(contentContainer, processedData);
+    // Afegir ridgeline plots (reutilitzen els shards ja descarregats pels violin plots)
+    renderWhenVisible(contentContainer, () => processedData.lazy.violinData(), (slot, violinData) => {
+        processedData.temporalAdvanced.violinData = violinData;
+        createRidgelinePlots(slot, processedData);
+    }, 500);
 }
 
 // Funció eliminada: ja no calen tabs, tot està en una sola vista
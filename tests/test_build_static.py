@@ -0,0 +1,58 @@
+"""Proves del graf de mòduls i del minificador de build_static.py"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from build_static import minify_js, module_graph  # noqa: E402
+
+
+def new_stats():
+    return {'cached': 0, 'rebuilt': 0}
+
+
+def test_regex_after_return_is_kept():
+    code = "function f(x) {\n    return /\\/\\//.test(x);\n}\n"
+    assert "return /\\/\\//.test(x);" in minify_js(code)
+
+
+def test_regex_after_keywords():
+    for keyword in ('typeof', 'case', 'in', 'of', 'void', 'delete', 'throw', 'new', 'else', 'yield', 'await'):
+        assert f"{keyword} /a\\/\\/b/" in minify_js(f"{keyword} /a\\/\\/b/\n")
+
+
+def test_division_after_postfix_increment():
+    assert minify_js("x = a++ / 2; // tail\n") == "x = a++ / 2;\n"
+    assert minify_js("x = a-- / 2; // tail\n") == "x = a-- / 2;\n"
+
+
+def test_division_after_identifier_and_property():
+    assert minify_js("x = total / n; // tail\n") == "x = total / n;\n"
+    assert minify_js("x = obj.return / 2; // tail\n") == "x = obj.return / 2;\n"
+
+
+def test_strings_and_templates_are_preserved():
+    code = "const url = 'https://example.org'; // comentari\nconst t = `a ${b ? `c // ${d}` : ''} e`;\n"
+    assert minify_js(code) == "const url = 'https://example.org';\nconst t = `a ${b ? `c // ${d}` : ''} e`;\n"
+
+
+def test_module_created_later_is_included(tmp_path):
+    (tmp_path / 'main.js').write_text("import { probeFn } from './probe.js';\nprobeFn();\n", encoding='utf-8')
+    cache = {}
+    assert module_graph('main.js', tmp_path, cache, new_stats()) == ['main.js']
+
+    (tmp_path / 'probe.js').write_text("export function probeFn() {}\n", encoding='utf-8')
+    stats = new_stats()
+    assert module_graph('main.js', tmp_path, cache, stats) == ['probe.js', 'main.js']
+    assert stats == {'cached': 1, 'rebuilt': 1}
+
+
+def test_deleted_module_is_skipped(tmp_path):
+    (tmp_path / 'main.js').write_text("import { probeFn } from './probe.js';\nprobeFn();\n", encoding='utf-8')
+    (tmp_path / 'probe.js').write_text("export function probeFn() {}\n", encoding='utf-8')
+    cache = {}
+    assert module_graph('main.js', tmp_path, cache, new_stats()) == ['probe.js', 'main.js']
+
+    (tmp_path / 'probe.js').unlink()
+    assert module_graph('main.js', tmp_path, cache, new_stats()) == ['main.js']
@@ -0,0 +1,55 @@
+"""Proves de la validació i neteja de src/process_data.py"""
+
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from process_data import prepare_data  # noqa: E402
+
+
+def raw_rows(dates):
+    """CSV original mínim amb una fila vàlida per cada data"""
+    n = len(dates)
+    return pd.DataFrame({
+        'Ocean': ['Atlantic Ocean'] * n,
+        'Region': ['North Atlantic'] * n,
+        'Country': ['Spain'] * n,
+        'Marine Setting': ['Ocean'] * n,
+        'Sampling Method': ['Manta net'] * n,
+        'Water Sample Depth (m)': [0.5] * n,
+        'Microplastics measurement': [1.5] * n,
+        'Unit': ['pieces/m3'] * n,
+        'Date (MM-DD-YYYY)': dates,
+        'Latitude (degree)': [40.0] * n,
+        'Longitude(degree)': [-10.0] * n,
+        'Mesh size (mm)': [0.3] * n,
+    })
+
+
+def test_malformed_dates_are_reported_not_raised():
+    dates = [
+        '7/13/1989 12:00:00 AM',
+        '1/15/2020',
+        '1/15/0201',                  # any fora del rang de datetime64[ns]
+        '2015-03-04T10:00:00+02:00',  # amb zona horària: es conserva l'hora local
+        'not a date',
+        '  ',                         # buida: no compta com a no parsejable
+    ]
+    microplastics, report = prepare_data(raw_rows(dates), 'test.csv')
+
+    rule = report['rules']['date_unparseable']
+    assert rule['count'] == 2
+    assert rule['sampleRowIndices'] == [2, 4]
+    assert report['validRows'] == len(dates)
+    assert microplastics['Date_parsed'].isna().tolist() == [False, False, True, False, True, True]
+    assert microplastics['Date_parsed'].iloc[3] == pd.Timestamp('2015-03-04 10:00:00')
+
+
+def test_year_is_integer():
+    microplastics, _ = prepare_data(raw_rows(['1/15/2020', '']), 'test.csv')
+    assert str(microplastics['Year'].dtype) == 'Int64'
+    assert microplastics['Year'].iloc[0] == 2020
+    assert pd.isna(microplastics['Year'].iloc[1])
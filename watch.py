@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Mode watch: vigila les dades originals i els mòduls JavaScript.
+Quan canvia el CSV es reprocessen les dades; quan canvia un mòdul JS es
+regenera el bundle.js. El procés es manté viu entre execucions, de manera
+que pandas/numpy i els mòduls del pipeline ja estan carregats.
+"""
+
+import argparse
+import sys
+import time
+import traceback
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+sys.path.insert(0, str(BASE_DIR / 'src'))
+
+import process_data  # noqa: E402
+from build_static import build_bundle  # noqa: E402
+
+# Interval de sondeig i temps de silenci abans de reconstruir (segons)
+POLL_INTERVAL = 0.2
+DEBOUNCE = 0.3
+
+def js_sources():
+    """Mòduls JavaScript que formen part del bundle"""
+    return [BASE_DIR / 'main.js'] + sorted((BASE_DIR / 'src').rglob('*.js'))
+
+def data_sources(csv_file):
+    """Fitxers de dades que alimenten el pipeline"""
+    return [Path(csv_file)]
+
+def snapshot(paths):
+    """Retorna {path: mtime_ns} dels fitxers existents"""
+    stamps = {}
+    for path in paths:
+        try:
+            stamps[path] = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            pass
+    return stamps
+
+def changed_paths(before, after):
+    """Fitxers creats, modificats o eliminats entre dos snapshots"""
+    return {p for p in before.keys() | after.keys() if before.get(p) != after.get(p)}
+
+def display_path(path):
+    """Path relatiu al projecte quan és possible"""
+    try:
+        return str(path.relative_to(BASE_DIR))
+    except ValueError:
+        return str(path)
+
+class Watcher:
+    """Decideix quines etapes cal tornar a executar segons els fitxers modificats"""
+
+    def __init__(self, csv_file=process_data.CSV_FILE, out_dir=process_data.DATA_PROCESSED):
+        self.csv_file = Path(csv_file)
+        self.out_dir = Path(out_dir)
+
+    def reprocess(self):
+        """Torna a llegir el CSV i regenera només els JSON que canvien"""
+        start = time.perf_counter()
+        # Les edicions en mode watch no s'afegeixen a l'històric de mètriques
+        _, changed = process_data.run(self.csv_file, self.out_dir, history_db=None)
+        print(f"[watch] Dades reprocessades en {time.perf_counter() - start:.2f}s "
+              f"({len(changed)} fitxers modificats)")
+
+    def rebuild(self):
+        """Regenera el bundle.js"""
+        start = time.perf_counter()
+        build_bundle()
+        print(f"[watch] Bundle regenerat en {time.perf_counter() - start:.2f}s")
+
+    def handle(self, changed):
+        """Executa només les etapes afectades pels fitxers modificats"""
+        data = set(data_sources(self.csv_file))
+        if changed & data:
+            self.run_step(self.reprocess)
+        if changed - data:
+            self.run_step(self.rebuild)
+
+    @staticmethod
+    def run_step(step):
+        # Un error en una edició a mitges no ha d'aturar el watch
+        try:
+            step()
+        except Exception:
+            traceback.print_exc()
+            print("[watch] ✗ Error; s'esperarà al següent canvi")
+
+    def watched_paths(self):
+        """Fitxers de dades i mòduls JavaScript vigilats"""
+        return data_sources(self.csv_file) + js_sources()
+
+    def watch(self, poll_interval=POLL_INTERVAL, debounce=DEBOUNCE):
+        """Bucle principal: sondeja, agrupa ràfegues de canvis i reconstrueix"""
+        stamps = snapshot(self.watched_paths())
+        print(f"[watch] Vigilant {len(stamps)} fitxers (Ctrl+C per sortir)")
+
+        while True:
+            time.sleep(poll_interval)
+            current = snapshot(self.watched_paths())
+            changed = changed_paths(stamps, current)
+            if not changed:
+                continue
+
+            # Debounce: esperar que no hi hagi canvis durant `debounce` segons
+            while True:
+                time.sleep(debounce)
+                latest = snapshot(self.watched_paths())
+                more = changed_paths(current, latest)
+                current = latest
+                if not more:
+                    break
+                changed |= more
+
+            stamps = current
+            names = ', '.join(sorted(display_path(p) for p in changed))
+            print(f"\n[watch] Canvis detectats: {names}")
+            self.handle(changed)
+
+def main():
+    parser = argparse.ArgumentParser(description="Reprocessa les dades i regenera el bundle quan canvien les fonts")
+    parser.add_argument('--csv', default=process_data.CSV_FILE, type=Path, help="CSV original a vigilar")
+    parser.add_argument('--out', default=process_data.DATA_PROCESSED, type=Path, help="Directori de sortida dels JSON")
+    parser.add_argument('--interval', default=POLL_INTERVAL, type=float, help="Interval de sondeig (s)")
+    parser.add_argument('--debounce', default=DEBOUNCE, type=float, help="Temps de silenci abans de reconstruir (s)")
+    parser.add_argument('--skip-initial', action='store_true', help="No executar el pipeline complet en arrencar")
+    args = parser.parse_args()
+
+    watcher = Watcher(args.csv, args.out)
+    if not args.skip_initial:
+        watcher.run_step(watcher.reprocess)
+        watcher.run_step(watcher.rebuild)
+
+    try:
+        watcher.watch(args.interval, args.debounce)
+    except KeyboardInterrupt:
+        print("\n[watch] Aturat")
+
+if __name__ == '__main__':
+    main()